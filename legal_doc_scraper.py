@@ -5,12 +5,22 @@ Just finds links, doesn't overthink it.
 """
 
 import os
-import json
+import re
+import threading
+import orjson
+import html as html_lib
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+import requests_cache
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
+from urllib.parse import urljoin, urlsplit
 from flask import Flask, request, jsonify
 
+try:
+    import hyperscan
+except ImportError:  # optional - falls back to the compiled regexes below
+    hyperscan = None
+
 app = Flask(__name__)
 
 # Simple keyword matching - no AI needed for detection
@@ -41,15 +51,209 @@ DOCUMENT_PATTERNS = {
 }
 
 
+def _compile_any(patterns: list) -> re.Pattern:
+    """Compile a list of literal strings into one alternation regex."""
+    # Longest first so overlapping alternatives prefer the more specific one
+    unique = sorted(set(patterns), key=len, reverse=True)
+    return re.compile("|".join(re.escape(p) for p in unique))
+
+
+# Flat (pattern, slug, compact, doc_type) table - the URL variants of each
+# pattern are derived here once instead of per anchor
+_PATTERN_TABLE = [
+    (pattern, pattern.replace(" ", "-"), pattern.replace(" ", ""), doc_type)
+    for doc_type, patterns in DOCUMENT_PATTERNS.items()
+    for pattern in patterns
+]
+
+# Compiled once at import: link-text matchers and URL (slug/compact) matchers
+TEXT_RES = {
+    doc_type: _compile_any([p for p, _, _, t in _PATTERN_TABLE if t == doc_type])
+    for doc_type in DOCUMENT_PATTERNS
+}
+HREF_RES = {
+    doc_type: _compile_any(
+        [s for _, slug, compact, t in _PATTERN_TABLE if t == doc_type for s in (slug, compact)]
+    )
+    for doc_type in DOCUMENT_PATTERNS
+}
+
+
+def _build_hyperscan_db():
+    """
+    Compile every text pattern and URL variant into one Hyperscan database.
+    Returns (db, ids) where ids[i] is the (tier, doc_type) for expression i.
+    """
+    expressions = []
+    ids = []
+    for pattern, slug, compact, doc_type in _PATTERN_TABLE:
+        expressions.append(re.escape(pattern).encode())
+        ids.append(("text", doc_type))
+        for variant in {slug, compact}:
+            expressions.append(re.escape(variant).encode())
+            ids.append(("href", doc_type))
+    
+    db = hyperscan.Database()
+    db.compile(
+        expressions=expressions,
+        ids=list(range(len(expressions))),
+        # No SINGLEMATCH: a URL variant can also occur in the text half, and
+        # we still need its match in the href half
+        flags=[0] * len(expressions)
+    )
+    return db, ids
+
+
+HS_DB, HS_IDS = _build_hyperscan_db() if hyperscan else (None, None)
+
+# A Hyperscan scratch can only be used by one scan at a time, so each thread
+# (each greenlet, under gevent's patched threading) gets its own
+_hs_local = threading.local()
+
+
+def _hs_scratch():
+    """Return this thread's Hyperscan scratch, allocating it on first use."""
+    scratch = getattr(_hs_local, "scratch", None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(HS_DB)
+    return scratch
+
+
+def match_doc_types(link_text: str, href_lower: str, doc_types) -> tuple:
+    """
+    Return (text_hits, href_hits): the doc types whose patterns appear in the
+    link text, and those whose slug/compact forms appear in the URL.
+    Both inputs are expected lower-cased.
+    """
+    if HS_DB is None:
+        text_hits = {t for t in doc_types if TEXT_RES[t].search(link_text)}
+        href_hits = {t for t in doc_types if t not in text_hits and HREF_RES[t].search(href_lower)}
+        return text_hits, href_hits
+    
+    # One scan over "text\0href"; the match end offset says which half hit
+    text_bytes = link_text.encode()
+    split = len(text_bytes)
+    text_hits = set()
+    href_hits = set()
+    
+    def on_match(expr_id, start, end, flags, context):
+        tier, doc_type = HS_IDS[expr_id]
+        if tier == "text" and end <= split:
+            text_hits.add(doc_type)
+        elif tier == "href" and end > split:
+            href_hits.add(doc_type)
+    
+    HS_DB.scan(
+        text_bytes + b"\0" + href_lower.encode(),
+        match_event_handler=on_match,
+        scratch=_hs_scratch()
+    )
+    return text_hits, href_hits
+
+
+# Hard cap on bytes read per page. Generous because footer links (what we
+# want) sit at the very end of the document.
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+# Response cache location; set SCRAPER_CACHE_PATH="" to disable caching
+CACHE_PATH = os.environ.get("SCRAPER_CACHE_PATH", "/tmp/scraper_cache") or None
+
+# Start of markup whose contents are never real links: comments and
+# <script>/<style> bodies (template strings, CSS content, commented-out nav)
+NON_CONTENT_RE = re.compile(r"<!--|<(script|style)\b", re.IGNORECASE)
+NON_CONTENT_END_RES = {
+    None: re.compile("-->"),
+    "script": re.compile(r"</script\b[^<>]*>", re.IGNORECASE),
+    "style": re.compile(r"</style\b[^<>]*>", re.IGNORECASE),
+}
+
+# Raw-HTML anchor scan: one pass over <a ...> / </a> tags, with the href
+# (double-, single- or unquoted) pulled from the opening tag's attributes.
+# [^<>]* stops at the next "<", so unclosed or broken tags cost nothing
+# extra - the scan stays linear in page size.
+ANCHOR_TAG_RE = re.compile(r"<(/?)a\b([^<>]*)>", re.IGNORECASE)
+# One whole name[=value] attribute pair. Walking pairs in order means an
+# "href=" inside another attribute's quoted value is never taken as the href.
+ATTR_RE = re.compile(
+    r"""([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?"""
+)
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+def is_cacheable(response: requests.Response) -> bool:
+    """
+    Only cache HTML whose declared size fits the byte cap. Anything else -
+    including chunked responses with no Content-Length - is left uncached so
+    get_page's streaming Content-Type check and byte cap apply, instead of
+    requests-cache downloading and storing the whole body.
+    """
+    content_type = response.headers.get("Content-Type", "text/html").lower()
+    if "html" not in content_type:
+        return False
+    
+    content_length = response.headers.get("Content-Length", "")
+    return content_length.isdigit() and int(content_length) <= MAX_PAGE_BYTES
+
+
+def _build_session(cache_path) -> requests.Session:
+    """Pooled session with browser headers; cached when cache_path is set."""
+    if cache_path:
+        # Cached for a day (shared across workers via sqlite) and revalidated
+        # with ETag / Last-Modified, so repeat scrapes are served locally or
+        # with a cheap 304
+        session = requests_cache.CachedSession(
+            cache_path,
+            backend="sqlite",
+            expire_after=86400,
+            cache_control=True,
+            allowable_codes=(200,),
+            filter_fn=is_cacheable
+        )
+    else:
+        session = requests.Session()
+    
+    session.headers.update({
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    })
+    session.mount("http://", HTTPAdapter(pool_connections=20, pool_maxsize=20, pool_block=False))
+    session.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=20, pool_block=False))
+    return session
+
+
+# Shared session - keeps connections alive across fetches and webhook calls.
+# Created on first fetch so importing the module doesn't touch the cache file.
+_SESSION = None
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session, creating it on first use."""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = _build_session(CACHE_PATH)
+    return _SESSION
+
+
 def get_page(url: str, timeout: int = 10) -> str:
     """Fetch a page, return HTML or empty string."""
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
-        response.raise_for_status()
-        return response.text
+        with get_session().get(url, timeout=timeout, allow_redirects=True, stream=True) as response:
+            response.raise_for_status()
+            
+            # Don't download PDFs, images, etc.
+            content_type = response.headers.get("Content-Type", "text/html").lower()
+            if "html" not in content_type:
+                print(f"Skipping {url}: not HTML ({content_type})")
+                return ""
+            
+            chunks = []
+            total = 0
+            for chunk in response.iter_content(chunk_size=65536):
+                chunks.append(chunk)
+                total += len(chunk)
+                if total >= MAX_PAGE_BYTES:
+                    break
+            
+            return b"".join(chunks).decode(response.encoding or "utf-8", errors="replace")
     except Exception as e:
         print(f"Failed to fetch {url}: {e}")
         return ""
@@ -66,54 +270,145 @@ def is_article_url(href: str) -> bool:
     return any(signal in href_lower for signal in article_signals)
 
 
+def strip_non_content(html: str) -> str:
+    """
+    Drop comments and <script>/<style> blocks. Linear: each opener is
+    followed by one search for its closer; an unclosed one swallows the
+    rest of the document, as it does in a browser. Offsets come from html
+    itself - a lowered copy can differ in length (e.g. Turkish "İ").
+
+    >>> strip_non_content('İ<script>"<a href=/bad>x</a>"</SCRIPT><a href=/ok>')
+    'İ<a href=/ok>'
+    """
+    parts = []
+    pos = 0
+    while True:
+        match = NON_CONTENT_RE.search(html, pos)
+        if not match:
+            parts.append(html[pos:])
+            break
+        parts.append(html[pos:match.start()])
+        
+        tag = match.group(1)
+        end = NON_CONTENT_END_RES[tag and tag.lower()].search(html, match.end())
+        if not end:
+            break
+        pos = end.end()
+    return "".join(parts)
+
+
+def get_href(attrs: str):
+    """Return the unescaped href from an <a> tag's attribute string, or None."""
+    for attr in ATTR_RE.finditer(attrs):
+        if attr.group(1).lower() == "href":
+            value = next((g for g in attr.group(2, 3, 4) if g is not None), "")
+            return html_lib.unescape(value).strip()
+    return None
+
+
+def iter_anchors(html: str):
+    """
+    Yield (href, link_text) for every <a href> on the page.
+    Strips comments/scripts/styles, then makes one pass over the anchor
+    tags in the raw HTML; falls back to a real parser only if that finds
+    nothing (malformed/unusual markup).
+    """
+    found = False
+    html_text = strip_non_content(html)
+    pending = None  # (href, start of inner markup) of the open anchor
+    
+    # A closing tag, the next <a>, or end of document ends the open anchor;
+    # link text is read from at most 2000 chars of its inner markup
+    for match in ANCHOR_TAG_RE.finditer(html_text + "</a>"):
+        if pending is not None:
+            found = True
+            href, start = pending
+            inner = html_text[start:min(match.start(), start + 2000)]
+            # The cap can cut a tag in half; drop the dangling "<span cla"
+            cut = inner.rfind("<")
+            if cut > inner.rfind(">"):
+                inner = inner[:cut]
+            yield href, html_lib.unescape(TAG_RE.sub("", inner)).strip()
+            pending = None
+        
+        if not match.group(1):
+            href = get_href(match.group(2))
+            if href is not None:
+                pending = (href, match.end())
+    
+    if found:
+        return
+    
+    # selectolax's Lexbor C parser copes with whatever markup we got
+    tree = LexborHTMLParser(html)
+    for node in tree.css("a[href]"):
+        yield (node.attributes.get("href") or "").strip(), node.text(strip=True)
+
+
 def find_legal_links(html: str, base_url: str) -> dict:
     """
     Scan page for legal document links.
     PRIORITY: Link text matches > URL matches
     FILTER: Skip obvious article/blog URLs
     """
-    soup = BeautifulSoup(html, "html.parser")
-    
     # Initialize results - two tiers: confirmed (link text) and maybe (URL only)
     results = {doc_type: "None" for doc_type in DOCUMENT_PATTERNS.keys()}
     maybe_results = {doc_type: None for doc_type in DOCUMENT_PATTERNS.keys()}
     
-    # Get all links
-    all_links = soup.find_all("a", href=True)
+    # Doc types still waiting on a link-text match; stop scanning once empty
+    remaining = set(DOCUMENT_PATTERNS.keys())
+    
+    # Header/footer/mobile menus repeat the same anchors; an identical
+    # (href, text) pair can't change the outcome, so skip it. Ints, not the
+    # (often long, UTM-tagged) strings - a rare collision only drops a dupe.
+    seen = set()
+    
+    # Parse the base once; most hrefs are absolute or root-relative and can
+    # be joined by concatenation instead of a full urljoin per anchor
+    base = urlsplit(base_url)
+    origin = f"{base.scheme}://{base.netloc}"
     
-    for link in all_links:
-        href = link.get("href", "").strip()
-        link_text = link.get_text(strip=True).lower()
+    for href, link_text in iter_anchors(html):
+        link_text = link_text.lower()
         href_lower = href.lower()
         
         # Skip empty or javascript links
         if not href or href.startswith("javascript:") or href == "#":
             continue
         
+        key = hash((href, link_text))
+        if key in seen:
+            continue
+        seen.add(key)
+        
         # Build absolute URL
-        full_url = urljoin(base_url, href)
+        if href.startswith(("http://", "https://")):
+            full_url = href
+        elif href.startswith("//"):
+            full_url = f"{base.scheme}:{href}"
+        elif href.startswith("/") and "/." not in href:
+            full_url = origin + href
+        else:
+            full_url = urljoin(base_url, href)
+        
+        text_hits, href_hits = match_doc_types(link_text, href_lower, remaining)
         
-        # Check each document type
-        for doc_type, patterns in DOCUMENT_PATTERNS.items():
-            # Skip if already confirmed via link text
-            if results[doc_type] != "None":
+        # Check each unconfirmed document type
+        for doc_type in tuple(remaining):
+            # TIER 1: Link text matches (high confidence)
+            if doc_type in text_hits:
+                results[doc_type] = full_url
+                remaining.discard(doc_type)
                 continue
             
-            for pattern in patterns:
-                # TIER 1: Link text matches (high confidence)
-                if pattern in link_text:
-                    results[doc_type] = full_url
-                    break
-                
-                # TIER 2: URL matches (only if not an article)
-                if maybe_results[doc_type] is None:
-                    pattern_slug = pattern.replace(" ", "-")
-                    pattern_compact = pattern.replace(" ", "")
-                    
-                    if (pattern_slug in href_lower or pattern_compact in href_lower):
-                        # Only accept if it doesn't look like an article
-                        if not is_article_url(href):
-                            maybe_results[doc_type] = full_url
+            # TIER 2: URL matches (only if not an article)
+            if maybe_results[doc_type] is None and doc_type in href_hits:
+                if not is_article_url(href):
+                    maybe_results[doc_type] = full_url
+        
+        # Every type confirmed - the rest of the page can't change anything
+        if not remaining:
+            break
     
     # Fill in maybes only where we didn't find confirmed matches
     for doc_type in results:
@@ -171,7 +466,11 @@ def scrape_endpoint():
     
     try:
         results = scrape_legal_documents(url)
-        return jsonify(results)
+        # orjson serialises straight to bytes; sorted keys match jsonify
+        return app.response_class(
+            orjson.dumps(results, option=orjson.OPT_SORT_KEYS),
+            mimetype="application/json"
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -186,11 +485,18 @@ def health():
 if __name__ == "__main__":
     import sys
     
-    if len(sys.argv) > 1:
+    # Production runs under gunicorn (see Procfile); the Flask dev server is
+    # only for local testing.
+    if len(sys.argv) > 1 and sys.argv[1] == "--dev":
+        port = int(os.environ.get("PORT", 5000))
+        app.run(host="0.0.0.0", port=port)
+    elif len(sys.argv) > 1:
+        # One-off scrape: always fetch live, don't create a cache file
+        CACHE_PATH = None
         test_url = sys.argv[1]
         print(f"Scraping: {test_url}\n")
         results = scrape_legal_documents(test_url)
-        print(json.dumps(results, indent=2))
+        print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
     else:
-        port = int(os.environ.get("PORT", 5000))
-        app.run(host="0.0.0.0", port=port)
+        print("Usage: python legal_doc_scraper.py <url> | --dev")
+        sys.exit(1)